@@ -48,10 +48,7 @@ def get_string_and_upload_time(event):
 
 
 def get_english(translations):
-    for translation in translations:
-        if translation['language'] == 'en':
-            return translation['text']
-    return ''
+    return next((translation['text'] for translation in translations if translation['language'] == 'en'), '')
 
 
 def get_datetime_from_timestamp(timestamp):
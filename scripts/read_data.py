@@ -1,12 +1,26 @@
-import json
-import statistics
+# read_data.py
+# The update file parsing functions are annotated so this module can be compiled with
+# `mypyc --ignore-missing-imports read_data.py`; the compiled module is a drop-in replacement
+
+from __future__ import annotations
+
+import ijson
+import orjson
+import numpy as np
 import os
+import sys
+from array import array
+from collections import defaultdict, deque
+from collections.abc import Iterator
+from functools import partial
+from itertools import islice
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timezone, timedelta
 from cassandra.cluster import Cluster
 from ssl import SSLContext, PROTOCOL_TLSv1_2 , CERT_REQUIRED
 import boto3
 from cassandra_sigv4.auth import SigV4AuthProvider
-from cassandra.query import BatchStatement, ConsistencyLevel, BatchType, SimpleStatement
+from cassandra.query import ConsistencyLevel, PreparedStatement
 from cassandra.concurrent import execute_concurrent, execute_concurrent_with_args 
 import time
 
@@ -14,6 +28,12 @@ import time
 # Number of seconds deviance for a bus to be considered "very late" or "very early"
 HIGH_DELAY = 300
 
+# Number of trip updates handed to a worker process at a time when reading an update file
+TRIPS_PER_CHUNK = 250
+
+# Prepared statements keyed by their CQL so each query is only prepared once per process
+_PREPARED: dict[str, PreparedStatement] = {}
+
 
 def create_session(access_key_id, secret_access_key, session_token):
     ssl_context = SSLContext(PROTOCOL_TLSv1_2)
@@ -33,162 +53,186 @@ def create_session(access_key_id, secret_access_key, session_token):
     return session
 
 
-def create_batch():
-    return BatchStatement(batch_type=BatchType.UNLOGGED, consistency_level=ConsistencyLevel.LOCAL_QUORUM)
-
+def prepare_statement(session, query):
+    prepared = _PREPARED.get(query)
+    if prepared is None:
+        prepared = session.prepare(query)
+        _PREPARED[query] = prepared
+    return prepared
 
-def create_statement(query):
-    return SimpleStatement(query_string=query, consistency_level=ConsistencyLevel.LOCAL_QUORUM)
 
-
-def get_trip_info(trip_data):
-    trip_id = trip_data['id']
-    trip_update = trip_data['tripUpdate']
-    trip = trip_update['trip']
-    trip_date = trip['startDate']
-    schedule_relationship = trip['scheduleRelationship']
-    route_id = trip['routeId']
-    direction_id = trip['directionId']
-    vehicle = trip_update['vehicle']['label']
+def get_trip_info(trip_data: dict) -> tuple[tuple[str, int], list[dict], str, str] | None:
+    trip_update = trip_data.get('tripUpdate')
+    if trip_update is None:
+        return None
+    trip = trip_update.get('trip')
+    vehicle_data = trip_update.get('vehicle')
+    if trip is None or vehicle_data is None or 'startDate' not in trip or 'scheduleRelationship' not in trip:
+        return None
+    trip_id = trip_data.get('id')
+    route_id = trip.get('routeId')
+    direction_id = trip.get('directionId')
+    vehicle = vehicle_data.get('label')
+    stop_time_updates = trip_update.get('stopTimeUpdate')
+    if trip_id is None or route_id is None or direction_id is None or vehicle is None or stop_time_updates is None:
+        return None
     
-    route_key = (route_id, direction_id)
-    stop_time_updates = trip_update['stopTimeUpdate']
+    # IDs repeat across every trip update, so share one string per ID for the dict keys built from them.
+    # Strings cache their hash, so these keys are as cheap to look up as integer ids would be
+    route_key = (sys.intern(route_id), direction_id)
     
-    return route_key, stop_time_updates, trip_id, vehicle
-
-
-def get_stop_info(stop):
-    try:
-        stop_sequence = stop['stopSequence']
-        arrival_delay = stop['arrival']['delay']
-        arrival_time = datetime.fromtimestamp(int(stop['arrival']['time']), tz=timezone.utc)
-        departure_delay = stop['departure']['delay']
-        stop_id = stop['stopId']
-        return stop_id, arrival_delay, arrival_time
-    except KeyError:
-        return None
+    return route_key, stop_time_updates, trip_id, sys.intern(vehicle)
 
 
-def get_next_stop_info(stop_updates):
-    if len(stop_updates) == 0:
-        return None
-    return get_stop_info(stop_updates[0])
-        
-        
-def get_stats(delays):
-    stats = {
-        'mean': round(statistics.mean(delays)),
-        'median': round(statistics.median(delays)),
-        'count': len(delays),
-        'very_early': sum(delay <= -HIGH_DELAY for delay in delays),
-        'very_late': sum(delay >= HIGH_DELAY for delay in delays)
-    }
+def get_grouped_stats(delays_by_key):
+    if len(delays_by_key) == 0:
+        return {}
+    
+    # Lay every group's delays out back to back so each statistic is a single reduction over all groups
+    keys = list(delays_by_key.keys())
+    counts = np.fromiter((len(delays) for delays in delays_by_key.values()), dtype=np.int64, count=len(keys))
+    delays = np.concatenate([np.frombuffer(delays, dtype=np.int32) for delays in delays_by_key.values()])
+    offsets = np.zeros(len(keys), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    
+    sums = np.add.reduceat(delays, offsets, dtype=np.int64)
+    means = sums / counts
+    very_early = np.add.reduceat(delays <= -HIGH_DELAY, offsets, dtype=np.int64)
+    very_late = np.add.reduceat(delays >= HIGH_DELAY, offsets, dtype=np.int64)
+    
+    # Pack (group, delay) into one int64 so a single sort orders the delays within each group,
+    # which puts each group's middle values at fixed offsets from its start
+    group_ids = np.repeat(np.arange(len(keys), dtype=np.int64), counts)
+    packed = np.sort((group_ids << 32) | (delays.astype(np.int64) + 2**31))
+    lower = (packed[offsets + (counts - 1) // 2] & 0xFFFFFFFF) - 2**31
+    upper = (packed[offsets + counts // 2] & 0xFFFFFFFF) - 2**31
+    medians = (lower + upper) / 2
+    
+    stats = {}
+    for i, key in enumerate(keys):
+        stats[key] = {
+            'mean': int(round(means[i])),
+            'median': int(round(medians[i])),
+            'count': int(counts[i]),
+            'sum': int(sums[i]),
+            'very_early': int(very_early[i]),
+            'very_late': int(very_late[i])
+        }
     return stats
 
 
 def get_route_stats(route_data):
-    route_stats = {}
-    for route_key, delays in route_data.items():
-        stats = get_stats(delays)
-        route_stats[route_key] = stats
-    return route_stats
+    return get_grouped_stats(route_data)
 
 
 def get_stop_stats(stop_data):
-    stop_stats = {}
-    for stop, delays in stop_data.items():
-        stats = get_stats(delays)
-        stop_stats[stop] = stats
-    return stop_stats
+    return get_grouped_stats(stop_data)
 
 
-def read_data(session, path):        
-    routes = {}
-    stops = {}
-    stop_updates = set()
-    results = []
-    with open(path, 'r') as f:
-        data = json.load(f)
-        current_route = None
-        for trip_data_string in data:
-            if current_route is not None:
-                routes[route_key] = current_route
-                current_route = None
-            
-            trip_data = json.loads(trip_data_string)
-            try:
-                route_key, stop_time_updates, trip_id, vehicle = get_trip_info(trip_data)
-            except KeyError:
+def parse_chunk(chunk: list[str]) -> tuple[dict[tuple[str, int], array[int]], dict[str, array[int]]]:
+    routes: defaultdict[tuple[str, int], array[int]] = defaultdict(partial(array, 'i'))
+    stops: defaultdict[str, array[int]] = defaultdict(partial(array, 'i'))
+    for trip_data_string in chunk:
+        trip_info = get_trip_info(orjson.loads(trip_data_string))
+        if trip_info is None:
+            continue
+        route_key, stop_time_updates, trip_id, vehicle = trip_info
+        
+        for i, stop in enumerate(stop_time_updates):
+            arrival = stop.get('arrival') or {}
+            departure = stop.get('departure') or {}
+            delay = arrival.get('delay')
+            arrival_time = arrival.get('time')
+            stop_id = stop.get('stopId')
+            if delay is None or arrival_time is None or stop_id is None or 'delay' not in departure or 'stopSequence' not in stop:
+                # A trip is only counted when its next stop has a usable update
+                if i == 0:
+                    break
                 continue
             
-            info = get_next_stop_info(stop_time_updates)
-            if info is None:
-                continue
-            _, delay, _ = info
-            try:
+            # The next stop's delay is the trip's delay for the route statistics
+            if i == 0:
                 routes[route_key].append(delay)
-            except KeyError:
-                routes[route_key] = [delay]
-            
-            for stop in stop_time_updates:
-                info = get_stop_info(stop)
-                if info is None:
-                    continue
-                stop_id, delay, arrival = info
-                try:
-                    stops[stop_id].append(delay)
-                except KeyError:
-                    stops[stop_id] = [delay]
-                # statement = create_statement(
-                #     f"""
-                #     INSERT INTO stop_update_test(stop_id, trip_id, route_id, direction_id, vehicle_label, delay, stop_time)
-                #     VALUES ('{stop_id}', '{trip_id}', '{route_key[0]}', {route_key[1]}, '{vehicle}', {delay}, '{arrival.isoformat(timespec='milliseconds')}')
-                #     """
-                # )
-                # results.append(session.execute_async(statement))
-                stop_updates.add((stop_id, arrival, trip_id))
-            if len(results) > 1000:
-                block_for_results(results)
-                results = []
+            stop_id = sys.intern(stop_id)
+            stops[stop_id].append(delay)
+            # stop_params.append((stop_id, trip_id, route_key[0], route_key[1], vehicle, delay, int(arrival_time)))
     return routes, stops
 
 
-
-def ingest_route_stats_by_route(session, route_stats, update_time):    
-    results = []
-    for route_key, stats in route_stats.items():
-        statement = create_statement(
-            f"""
-            INSERT INTO route_stat_by_route_test (
-                route_id, 
-                direction_id,
-                average_delay, 
-                median_delay, 
-                very_early_count,
-                very_late_count,
-                vehicle_count,
-                update_time
-            )
-            VALUES (
-                '{route_key[0]}', 
-                {route_key[1]}, 
-                {stats['mean']},
-                {stats['median']},
-                {stats['very_early']},
-                {stats['very_late']},
-                {stats['count']},
-                '{update_time.isoformat(timespec='milliseconds')}'
-            )
-            """
+def merge_delays(delays_by_key: defaultdict, partial_delays_by_key: dict) -> None:
+    for key, delays in partial_delays_by_key.items():
+        delays_by_key[key].extend(delays)
+
+
+def read_chunks(items: Iterator[str], chunk_size: int) -> Iterator[list[str]]:
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def read_data(session, path: str) -> tuple[dict[tuple[str, int], array[int]], dict[str, array[int]]]:
+    routes: defaultdict[tuple[str, int], array[int]] = defaultdict(partial(array, 'i'))
+    stops: defaultdict[str, array[int]] = defaultdict(partial(array, 'i'))
+    workers = os.cpu_count() or 1
+    pending: deque[Future] = deque()
+    # Stream trip updates off the file and keep only a few chunks per worker in flight,
+    # so memory stays bounded by the chunk size rather than the size of the file
+    with open(path, 'rb') as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in read_chunks(ijson.items(f, 'item'), TRIPS_PER_CHUNK):
+            pending.append(executor.submit(parse_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                routes_partial, stops_partial = pending.popleft().result()
+                merge_delays(routes, routes_partial)
+                merge_delays(stops, stops_partial)
+        while len(pending) > 0:
+            routes_partial, stops_partial = pending.popleft().result()
+            merge_delays(routes, routes_partial)
+            merge_delays(stops, stops_partial)
+    return dict(routes), dict(stops)
+
+
+
+def ingest_route_stats_by_route(session, route_stats, update_time):
+    print(f"Ingesting {len(route_stats)} records to route_stat_by_route_test")
+    insert_stat = prepare_statement(session,
+        """
+        INSERT INTO route_stat_by_route_test (
+            route_id, 
+            direction_id,
+            average_delay, 
+            median_delay, 
+            very_early_count,
+            very_late_count,
+            vehicle_count,
+            update_time
         )
-        results.append(session.execute_async(statement))
-    return results
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """
+    )
+    params = []
+    for route_key, stats in route_stats.items():
+        params.append((
+            route_key[0],
+            route_key[1],
+            stats['mean'],
+            stats['median'],
+            stats['very_early'],
+            stats['very_late'],
+            stats['count'],
+            update_time
+        ))
+    
+    results = execute_concurrent_with_args(session, insert_stat, params, concurrency=128, raise_on_first_error=False)
+    for (success, result) in results:
+        if not success:
+            print("ERROR:", result)
 
 
 def ingest_route_stats_by_time(session, route_stats, route_results, update_time):
-    results = []
-    
-    insert_stat = session.prepare(
+    print(f"Ingesting {len(route_stats)} records to route_stat_by_time_test")
+    insert_stat = prepare_statement(session,
         """
         INSERT INTO route_stat_by_time_test (
             route_id,
@@ -210,15 +254,12 @@ def ingest_route_stats_by_time(session, route_stats, route_results, update_time)
         """
     )
     
-    batch = create_batch()
-    count = 0
+    params = []
     for route_key, stats, in route_stats.items():
-        if count == 30:
-            results.append(session.execute_async(batch))
-            batch = create_batch()
-            count = 0
-        route_details = route_results[route_key].result()[0]
-        batch.add(insert_stat, (
+        route_details = route_results.get(route_key)
+        if route_details is None:
+            continue
+        params.append((
             route_key[0],
             route_details.route_short_name,
             route_details.route_long_name,
@@ -234,49 +275,50 @@ def ingest_route_stats_by_time(session, route_stats, route_results, update_time)
             update_time.date(),
             update_time
         ))
-        count += 1
-    results.append(session.execute_async(batch))
-    return results
+    
+    results = execute_concurrent_with_args(session, insert_stat, params, concurrency=64, raise_on_first_error=False)
+    for (success, result) in results:
+        if not success:
+            print("ERROR:", result)
 
 
 def ingest_stop_stats_by_stop(session, stop_stats, update_time):
-    results = []
     print(f"Ingesting {len(stop_stats)} records to stop_stats_by_stop")
-    for stop_id, stats in stop_stats.items():
-        statement = create_statement(
-            f"""
-            INSERT INTO stop_stat_by_stop_test (
-                stop_id, 
-                average_delay, 
-                median_delay, 
-                very_early_count,
-                very_late_count,
-                stop_count,
-                update_time
-            )
-            VALUES (
-                '{stop_id}', 
-                {stats['mean']},
-                {stats['median']},
-                {stats['very_early']},
-                {stats['very_late']},
-                {stats['count']},
-                '{update_time.isoformat(timespec='milliseconds')}'
-            )
-            """
+    insert_stat = prepare_statement(session,
+        """
+        INSERT INTO stop_stat_by_stop_test (
+            stop_id, 
+            average_delay, 
+            median_delay, 
+            very_early_count,
+            very_late_count,
+            stop_count,
+            update_time
         )
-        results.append(session.execute_async(statement))
-        if len(results) > 50:
-            block_for_results(results)
-            results = []
-    block_for_results(results)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+    )
+    params = []
+    for stop_id, stats in stop_stats.items():
+        params.append((
+            stop_id,
+            stats['mean'],
+            stats['median'],
+            stats['very_early'],
+            stats['very_late'],
+            stats['count'],
+            update_time
+        ))
+    
+    results = execute_concurrent_with_args(session, insert_stat, params, concurrency=128, raise_on_first_error=False)
+    for (success, result) in results:
+        if not success:
+            print("ERROR:", result)
 
 
 def ingest_stop_stats_by_time(session, stop_stats, stop_results, update_time):
-    results = []
-    
     print(f"Ingesting {len(stop_stats)} records to stop_stats_by_time")
-    insert_stat = session.prepare(
+    insert_stat = prepare_statement(session,
         """
         INSERT INTO stop_stat_by_time_test (
             stop_id, 
@@ -299,18 +341,12 @@ def ingest_stop_stats_by_time(session, stop_stats, stop_results, update_time):
         """
     )
     
-    batch = create_batch()
-    count = 0
+    params = []
     for stop_id, stats, in stop_stats.items():
-        if count == 30:
-            session.execute(batch)
-            batch = create_batch()
-            count = 0
-        all_stop_details = stop_results[stop_id].result().all()
-        if (len(all_stop_details) == 0):
+        stop_details = stop_results.get(stop_id)
+        if stop_details is None:
             continue
-        stop_details = all_stop_details[0]
-        batch.add(insert_stat, (
+        params.append((
             stop_id,
             stop_details.stop_code,
             stop_details.stop_name,
@@ -327,57 +363,115 @@ def ingest_stop_stats_by_time(session, stop_stats, stop_results, update_time):
             update_time.date(),
             update_time
         ))
-        count += 1
-        if len(results) > 10:
-            block_for_results(results)
-            results = []
-    results.append(session.execute_async(batch))
-    block_for_results(results)
+    
+    results = execute_concurrent_with_args(session, insert_stat, params, concurrency=64, raise_on_first_error=False)
+    for (success, result) in results:
+        if not success:
+            print("ERROR:", result)
+
+
+def ingest_route_delay_agg(session, route_stats, update_time):
+    print(f"Adding {len(route_stats)} records to route_delay_agg_test")
+    update_stat = prepare_statement(session,
+        """
+        UPDATE route_delay_agg_test
+        SET sum_delay = sum_delay + ?,
+            delay_count = delay_count + ?,
+            very_early_count = very_early_count + ?,
+            very_late_count = very_late_count + ?
+        WHERE route_id = ? AND direction_id = ? AND day = ?
+        """
+    )
+    params = []
+    for route_key, stats in route_stats.items():
+        params.append((
+            stats['sum'],
+            stats['count'],
+            stats['very_early'],
+            stats['very_late'],
+            route_key[0],
+            route_key[1],
+            update_time.date()
+        ))
+    
+    results = execute_concurrent_with_args(session, update_stat, params, concurrency=128, raise_on_first_error=False)
+    for (success, result) in results:
+        if not success:
+            print("ERROR:", result)
+
+
+def ingest_stop_updates(session, stop_params):
+    print(f"Ingesting {len(stop_params)} records to stop_update_test")
+    insert_stat = prepare_statement(session,
+        """
+        INSERT INTO stop_update_test(stop_id, trip_id, route_id, direction_id, vehicle_label, delay, stop_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+    )
+    params = [
+        (stop_id, trip_id, route_id, direction_id, vehicle, delay, datetime.fromtimestamp(arrival, tz=timezone.utc))
+        for stop_id, trip_id, route_id, direction_id, vehicle, delay, arrival in stop_params
+    ]
+    results = execute_concurrent_with_args(session, insert_stat, params, concurrency=64, raise_on_first_error=False)
+    for (success, result) in results:
+        if not success:
+            print("ERROR:", result)
 
 
 def get_route_data(session, route_stats):
-    results = {}
-    for route_id, direction_id in route_stats.keys():
-        query = create_statement(f"SELECT * FROM route WHERE route_id = '{route_id}' AND direction_id = {direction_id};")
-        results[(route_id, direction_id)] = session.execute_async(query)
-    return results
+    select_statement = prepare_statement(session, "SELECT * FROM route WHERE route_id = ? AND direction_id = ?")
+    route_keys = list(route_stats.keys())
+    results = execute_concurrent_with_args(session, select_statement, route_keys, concurrency=64,
+                                           raise_on_first_error=False, results_generator=True)
+    route_data = {}
+    for route_key, (success, result) in zip(route_keys, results):
+        if not success:
+            print("ERROR:", result)
+            continue
+        row = result.one()
+        if row is not None:
+            route_data[route_key] = row
+    return route_data
 
 def get_stop_data(session, stop_stats):
-    results = {}
-    for stop_id in stop_stats.keys():
-        query = create_statement(f"SELECT * FROM stop WHERE stop_id = '{stop_id}';")
-        results[stop_id] = session.execute_async(query)
-    return results
-
+    select_statement = prepare_statement(session, "SELECT * FROM stop WHERE stop_id = ?")
+    stop_ids = list(stop_stats.keys())
+    results = execute_concurrent_with_args(session, select_statement, [(stop_id,) for stop_id in stop_ids], concurrency=64,
+                                           raise_on_first_error=False, results_generator=True)
+    stop_data = {}
+    for stop_id, (success, result) in zip(stop_ids, results):
+        if not success:
+            print("ERROR:", result)
+            continue
+        row = result.one()
+        if row is not None:
+            stop_data[stop_id] = row
+    return stop_data
 
-def block_for_results(results):
-    for result in results:
-        result.result()
-        
-        
 
 def delete_test_records(session, table):
-    results = session.execute(f"SELECT route_id, direction_id, update_time FROM {table} WHERE update_time < '2020-01-01' ALLOW FILTERING")
-    for result in results:
-        print(result[0], result[1], result[2])
-        statement = SimpleStatement(f"DELETE FROM {table} WHERE route_id = '{result[0]}' AND direction_id = {result[1]} AND update_time < '2020-01-01';",
-                                    consistency_level=ConsistencyLevel.LOCAL_QUORUM)
-        session.execute(statement)
+    # Only partition keys are selected, so no filtering is needed to find the partitions to clean up
+    partitions = session.execute(f"SELECT DISTINCT route_id, direction_id FROM {table}")
+    delete_statement = prepare_statement(session, f"DELETE FROM {table} WHERE route_id = ? AND direction_id = ? AND update_time < ?")
+    cutoff = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    params = [(partition[0], partition[1], cutoff) for partition in partitions]
+    print(f"Deleting test records from {len(params)} partitions of {table}")
+    
+    results = execute_concurrent_with_args(session, delete_statement, params, concurrency=32, raise_on_first_error=False)
+    for (success, result) in results:
+        if not success:
+            print("ERROR:", result)
         
         
 def get_english(translations):
-    for translation in translations:
-        if translation['language'] == 'en':
-            return translation['text']
-    return ''
+    return next((translation['text'] for translation in translations if translation['language'] == 'en'), '')
         
         
 def read_alerts(path):
     results = []
-    with open(path, 'r') as f:
-        data = json.load(f)
-        for alert in data:
-            alert = json.loads(alert)
+    with open(path, 'rb') as f:
+        for alert in ijson.items(f, 'item'):
+            alert = orjson.loads(alert)
             alert_details = alert['alert']
             header = get_english(alert_details['headerText']['translation'])
             description = get_english(alert_details['descriptionText']['translation'])
@@ -407,10 +501,9 @@ def read_alerts(path):
         
 def read_position_update(path, upload_time):
     results = []
-    with open(path, 'r') as f:
-        data = json.load(f)
-        for update in data:
-            update = json.loads(update)['vehicle']
+    with open(path, 'rb') as f:
+        for update in ijson.items(f, 'item'):
+            update = orjson.loads(update)['vehicle']
             params = (
                 update['vehicle']['id'],
                 update['vehicle']['label'],
@@ -430,7 +523,7 @@ def read_position_update(path, upload_time):
 
 def ingest_position_update(session, position_params):
     print(f"Ingesting {len(position_params)} records to vehicle_by_route")
-    insert_statement = session.prepare(
+    insert_statement = prepare_statement(session,
         """
         INSERT INTO vehicle_by_route(
             vehicle_id,
@@ -455,13 +548,13 @@ def ingest_position_update(session, position_params):
             
             
 def ingest_update_time(session, update_time):
-    prepared = session.prepare(f"INSERT INTO update_time(day, update_time) VALUES (?, ?)")
+    prepared = prepare_statement(session, "INSERT INTO update_time(day, update_time) VALUES (?, ?)")
     bound = prepared.bind((update_time.date(), update_time))
     session.execute(bound)
     
     
 def get_last_update_time(session):
-    statement = session.prepare("SELECT * FROM update_time WHERE day = ? LIMIT 1")
+    statement = prepare_statement(session, "SELECT * FROM update_time WHERE day = ? LIMIT 1")
     now = datetime.now()
     today = now.date()
     yesterday = (now - timedelta(days=1)).date()
@@ -478,21 +571,36 @@ def get_last_update_time(session):
 
 
 def get_vehicle_updates(session, route_id, direction_id, update_time):
-    prepared = session.prepare("SELECT * FROM vehicle_by_route WHERE update_time = ? AND route_id = ? AND direction_id = ?")
+    prepared = prepare_statement(session, "SELECT * FROM vehicle_by_route WHERE update_time = ? AND route_id = ? AND direction_id = ?")
     bound = prepared.bind((update_time, route_id, direction_id))
     results = session.execute(bound)
     return results
 
 
+def get_route_delay_agg(session, route_id, direction_id, day):
+    prepared = prepare_statement(session, "SELECT * FROM route_delay_agg WHERE route_id = ? AND direction_id = ? AND day = ?")
+    bound = prepared.bind((route_id, direction_id, day))
+    row = session.execute(bound).one()
+    if row is None or not row.delay_count:
+        return None
+    # The mean is derived from the counters at read time since counters can only be incremented
+    return {
+        'mean': round(row.sum_delay / row.delay_count),
+        'count': row.delay_count,
+        'very_early': row.very_early_count,
+        'very_late': row.very_late_count
+    }
+
+
 def get_route_updates(session, update_time):
-    prepared = session.prepare("SELECT * FROM route_stat_by_time WHERE day = ? AND update_time = ?")
+    prepared = prepare_statement(session, "SELECT * FROM route_stat_by_time WHERE day = ? AND update_time = ?")
     bound = prepared.bind((update_time.date(), update_time))
     results = session.execute(bound)
     return results
 
 
-def get_stop_stats(session, update_time):
-    prepared = session.prepare("SELECT * FROM stop_stat_by_time WHERE day = ? AND update_time = ?")
+def get_stop_updates(session, update_time):
+    prepared = prepare_statement(session, "SELECT * FROM stop_stat_by_time WHERE day = ? AND update_time = ?")
     bound = prepared.bind((update_time.date(), update_time))
     results = session.execute(bound)
     return results
@@ -516,7 +624,7 @@ if __name__ == '__main__':
     t5 = time.time()
     print("Routes update retrieval time:", t5 - t4)
     print(len(results))
-    results = get_stop_stats(session, update_time).all()
+    results = get_stop_updates(session, update_time).all()
     t6 = time.time()
     print("Stop stats retrieval time:", t6 - t5)
     print(len(results))
@@ -545,12 +653,10 @@ if __name__ == '__main__':
     
     # Ingest statistics
     # print("Beginning ingestion...")
-    # route_stats_by_route_results = ingest_route_stats_by_route(session, route_stats, upload_time)
-    # route_stats_by_time_results = ingest_route_stats_by_time(session, route_stats, route_detail_results, upload_time)
+    # ingest_route_stats_by_route(session, route_stats, upload_time)
+    # ingest_route_stats_by_time(session, route_stats, route_detail_results, upload_time)
+    # ingest_route_delay_agg(session, route_stats, upload_time)
     # ingest_stop_stats_by_stop(session, stop_stats, upload_time)
     # ingest_stop_stats_by_time(session, stop_stats, stop_detail_results, upload_time)
     
-    # print("Waiting for results to ingest...")
-    # block_for_results(route_stats_by_route_results)
-    # block_for_results(route_stats_by_time_results)
     # print("Ingestion complete!")
\ No newline at end of file
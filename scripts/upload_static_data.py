@@ -142,6 +142,25 @@ def create_stop_statistic_tables(session, test=False):
     )
     
     
+def create_route_delay_agg_table(session, test=False):
+    test_label = "_test" if test else ""
+    # Counter table, so each day's totals are accumulated by Keyspaces as update files are ingested
+    session.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS route_delay_agg{test_label}(
+            route_id varchar,
+            direction_id int,
+            day date,
+            sum_delay counter,
+            delay_count counter,
+            very_early_count counter,
+            very_late_count counter,
+            PRIMARY KEY ((route_id, direction_id), day)
+        ) WITH CLUSTERING ORDER BY (day DESC)
+        """
+    )
+    
+
 def create_stop_update_table(session):
     session.execute(
         f"""
@@ -343,6 +362,7 @@ if __name__ == "__main__":
     # create_vehicle_by_route_table(session)
     # create_route_statistic_tables(session, test=False)
     # create_stop_statistic_tables(session, test=True)
+    # create_route_delay_agg_table(session, test=True)
     # create_stop_update_table(session)
     # create_route_table(session)
     # create_stop_table(session)